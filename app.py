@@ -1,18 +1,101 @@
 import os
+import sqlite3
 from datetime import datetime, timedelta
-from decimal import Decimal, InvalidOperation
-
-from flask import Flask, jsonify, request, url_for
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Annotated
+
+import msgspec
+import orjson
+from a2wsgi import WSGIMiddleware
+from flask import Flask, Response, abort, jsonify, request, stream_with_context, url_for
+from flask.json.provider import JSONProvider
+from flask_caching import Cache
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, and_
+from sqlalchemy import DDL, bindparam, event, insert, inspect, make_url, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///stockflow.db")
+REDIS_URL = os.getenv("REDIS_URL")
+ALERTS_BATCH_SIZE = 1000
+ALERTS_CACHE_TIMEOUT = 60
+ALERTS_CACHE_MAX_BYTES = 1024 * 1024
+INVENTORY_BATCH_SIZE = 10000
+MAX_PRICE = Decimal("1e10")
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "8"))
+
+def engine_options(url):
+    options = {"insertmanyvalues_page_size": 10000}
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite":
+        options.update(pool_size=20, max_overflow=40, pool_recycle=1800, pool_pre_ping=True)
+    if url.get_backend_name() == "postgresql" and url.get_driver_name() == "psycopg2":
+        # psycopg2 fast execution helpers: multi-row VALUES for INSERT,
+        # execute_batch for UPDATE/DELETE executemany.
+        options.update(executemany_mode="values_plus_batch", executemany_batch_page_size=500)
+    return options
+
+@event.listens_for(Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores REFERENCES unless asked; enforce them like PostgreSQL."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+class OrJsonProvider(JSONProvider):
+    """jsonify()/request.get_json() backed by orjson.
+
+    orjson has no Decimal support, so Decimals are emitted as strings (what
+    Flask's default provider does too). Keys are not sorted.
+    """
+    @staticmethod
+    def _default(obj):
+        if isinstance(obj, Decimal):
+            return str(obj)
+        raise TypeError
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self._default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self._default), mimetype="application/json")
 
 app = Flask(__name__)
+app.json = OrJsonProvider(app)
 app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-db = SQLAlchemy(app)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(DATABASE_URL)
+# Every flush in the app is explicit, and no view reads instances back after
+# commit, so skip autoflush and post-commit expiry (and the reloads it causes).
+db = SQLAlchemy(app, session_options={"autoflush": False, "expire_on_commit": False})
+
+app.config["CACHE_TYPE"] = "RedisCache" if REDIS_URL else "SimpleCache"
+app.config["CACHE_REDIS_URL"] = REDIS_URL
+app.config["CACHE_KEY_PREFIX"] = "stockflow:"
+cache = Cache(app)
+
+# Current UTC time as a naive timestamp, for server defaults on DateTime
+# columns. Plain now() would store the session's local time.
+class utcnow(FunctionElement):
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "(now() AT TIME ZONE 'utc')"
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
 
 # ---- Models ----
 class Company(db.Model):
@@ -33,7 +116,7 @@ class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     sku = db.Column(db.String, unique=True, nullable=False)
     name = db.Column(db.String, nullable=False)
-    price = db.Column(db.Numeric(12,2), nullable=False, default=0.00)
+    price_cents = db.Column(db.BigInteger, nullable=False, default=0)  # price in cents
     product_type = db.Column(db.String, nullable=False, default="standard")
     active = db.Column(db.Boolean, nullable=False, default=True)
 
@@ -50,24 +133,30 @@ class SupplierProduct(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
     company_id = db.Column(db.Integer)
     lead_time_days = db.Column(db.Integer, default=7)
+    __table_args__ = (db.Index("ix_sp_product_lead", "product_id", "lead_time_days"),)
 
 class Inventory(db.Model):
     __tablename__ = "inventories"
     product_id = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
     warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouses.id", ondelete="CASCADE"), primary_key=True)
+    # Denormalized from warehouses.company_id (set by the app on insert) so
+    # tenant-scoped reads filter inventories directly.
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=0)
     safety_stock = db.Column(db.Integer, default=0)
+    __table_args__ = (db.Index("ix_inv_company_wh", "company_id", "warehouse_id"),)
 
 class InventoryChange(db.Model):
     __tablename__ = "inventory_changes"
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
     warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouses.id", ondelete="CASCADE"), nullable=False)
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
     quantity_delta = db.Column(db.Integer, nullable=False)
     reason = db.Column(db.String)
     ref_type = db.Column(db.String)
     ref_id = db.Column(db.Integer)
-    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=utcnow())
 
 class ProductBundle(db.Model):
     __tablename__ = "product_bundles"
@@ -79,7 +168,7 @@ class SalesOrder(db.Model):
     __tablename__ = "sales_orders"
     id = db.Column(db.Integer, primary_key=True)
     company_id = db.Column(db.Integer, db.ForeignKey("companies.id", ondelete="CASCADE"), nullable=False)
-    ordered_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ordered_at = db.Column(db.DateTime, nullable=False, server_default=utcnow())
 
 class SalesOrderItem(db.Model):
     __tablename__ = "sales_order_items"
@@ -88,6 +177,72 @@ class SalesOrderItem(db.Model):
     warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouses.id", ondelete="RESTRICT"), primary_key=True)
     quantity = db.Column(db.Integer, nullable=False)
 
+# Units sold per company, day, product and warehouse. Maintained by an AFTER
+# INSERT trigger on sales_order_items, so the alerts query sums at most one
+# row per day instead of re-aggregating every line item in the window.
+class DailySalesSummary(db.Model):
+    __tablename__ = "daily_sales_summary"
+    company_id = db.Column(db.Integer, db.ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True)
+    sale_date = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouses.id", ondelete="CASCADE"), primary_key=True)
+    qty = db.Column(db.Integer, nullable=False, default=0)
+
+def sale_date_sql(connection):
+    """SQL for the UTC calendar day of `so.ordered_at` on this connection."""
+    if connection.dialect.name != "postgresql":
+        return "date(so.ordered_at)"  # SQLite's date() reads the stored UTC text as-is
+    column = next(c for c in inspect(connection).get_columns("sales_orders") if c["name"] == "ordered_at")
+    if getattr(column["type"], "timezone", False):
+        return "(so.ordered_at AT TIME ZONE 'utc')::date"  # TIMESTAMPTZ from schema.sql
+    return "so.ordered_at::date"  # naive TIMESTAMP from create_all(), already UTC
+
+@event.listens_for(db.metadata, "after_create")
+def create_daily_sales_summary_trigger(target, connection, **kw):
+    sale_date = sale_date_sql(connection)
+    if connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"""
+CREATE OR REPLACE FUNCTION daily_sales_summary_add() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO daily_sales_summary (company_id, sale_date, product_id, warehouse_id, qty)
+    SELECT so.company_id, {sale_date}, NEW.product_id, NEW.warehouse_id, NEW.quantity
+    FROM sales_orders so WHERE so.id = NEW.order_id
+    ON CONFLICT (company_id, sale_date, product_id, warehouse_id)
+    DO UPDATE SET qty = daily_sales_summary.qty + EXCLUDED.qty;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+""")
+        connection.exec_driver_sql("DROP TRIGGER IF EXISTS trg_sales_order_items_summary ON sales_order_items")
+        connection.exec_driver_sql("""
+CREATE TRIGGER trg_sales_order_items_summary AFTER INSERT ON sales_order_items
+FOR EACH ROW EXECUTE FUNCTION daily_sales_summary_add()
+""")
+    elif connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(f"""
+CREATE TRIGGER IF NOT EXISTS trg_sales_order_items_summary AFTER INSERT ON sales_order_items
+BEGIN
+    INSERT INTO daily_sales_summary (company_id, sale_date, product_id, warehouse_id, qty)
+    SELECT so.company_id, {sale_date}, NEW.product_id, NEW.warehouse_id, NEW.quantity
+    FROM sales_orders so WHERE so.id = NEW.order_id
+    ON CONFLICT (company_id, sale_date, product_id, warehouse_id) DO UPDATE SET qty = qty + excluded.qty;
+END
+""")
+    # A summary table added to an existing database starts out empty, so
+    # backfill it from the sales already recorded. create_all() runs in one
+    # transaction, and on PostgreSQL the lock keeps concurrent line items out
+    # until the trigger is in place.
+    if DailySalesSummary.__table__ in kw.get("tables", ()):
+        if connection.dialect.name == "postgresql":
+            connection.exec_driver_sql("LOCK TABLE sales_order_items IN SHARE MODE")
+        connection.exec_driver_sql(f"""
+INSERT INTO daily_sales_summary (company_id, sale_date, product_id, warehouse_id, qty)
+SELECT so.company_id, {sale_date}, soi.product_id, soi.warehouse_id, SUM(soi.quantity)
+FROM sales_order_items soi
+JOIN sales_orders so ON so.id = soi.order_id
+GROUP BY so.company_id, {sale_date}, soi.product_id, soi.warehouse_id
+""")
+
 class ProductThreshold(db.Model):
     __tablename__ = "product_thresholds"
     product_id = db.Column(db.Integer, db.ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
@@ -99,63 +254,158 @@ class ProductThresholdOverride(db.Model):
     warehouse_id = db.Column(db.Integer, db.ForeignKey("warehouses.id", ondelete="CASCADE"), primary_key=True)
     threshold = db.Column(db.Integer, nullable=False)
 
+# Per-(product, warehouse) threshold with the override already applied, so
+# the alerts query does one keyed lookup instead of two outer joins. Pairs
+# with no threshold are left out, but a product default still expands to one
+# row per warehouse. Materialized on PostgreSQL and refreshed out of band by
+# `flask refresh-thresholds` (run it after threshold or warehouse changes, or
+# from a periodic job), so writes to the base tables never pay for a rebuild;
+# a plain view elsewhere.
+EFFECTIVE_THRESHOLDS_SELECT = """
+SELECT p.id AS product_id, w.id AS warehouse_id, COALESCE(o.threshold, t.threshold) AS threshold
+FROM products p
+CROSS JOIN warehouses w
+LEFT JOIN product_thresholds t ON t.product_id = p.id
+LEFT JOIN product_threshold_overrides o ON o.product_id = p.id AND o.warehouse_id = w.id
+WHERE o.threshold IS NOT NULL OR t.threshold IS NOT NULL
+"""
+event.listen(db.metadata, "after_create", DDL(
+    "CREATE MATERIALIZED VIEW IF NOT EXISTS effective_thresholds AS" + EFFECTIVE_THRESHOLDS_SELECT
+).execute_if(dialect="postgresql"))
+event.listen(db.metadata, "after_create", DDL(
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_effective_thresholds ON effective_thresholds (product_id, warehouse_id)"
+).execute_if(dialect="postgresql"))
+event.listen(db.metadata, "after_create", DDL(
+    "CREATE VIEW IF NOT EXISTS effective_thresholds AS" + EFFECTIVE_THRESHOLDS_SELECT
+).execute_if(callable_=lambda ddl, target, bind, **kw: bind.dialect.name != "postgresql"))
+event.listen(db.metadata, "before_drop", DDL(
+    "DROP MATERIALIZED VIEW IF EXISTS effective_thresholds"
+).execute_if(dialect="postgresql"))
+event.listen(db.metadata, "before_drop", DDL(
+    "DROP VIEW IF EXISTS effective_thresholds"
+).execute_if(callable_=lambda ddl, target, bind, **kw: bind.dialect.name != "postgresql"))
+
+def refresh_effective_thresholds():
+    if db.session.get_bind().dialect.name == "postgresql":
+        db.session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY effective_thresholds"))
+        db.session.commit()
+    invalidate_alerts_cache()
+
+@app.cli.command("refresh-thresholds")
+def refresh_thresholds_command():
+    """Rebuild effective_thresholds and drop cached alerts."""
+    refresh_effective_thresholds()
+
 # ---- Health ----
 @app.route("/health")
 def health():
     return {"status": "ok"}
 
-# ---- Helper ----
-def decimal_from(value):
+# ---- Request schemas ----
+# Decoded and validated in one pass with msgspec. strict=False lets numeric
+# strings through (e.g. "initial_quantity": "5"), as the old int() checks did.
+class CreateProductReq(msgspec.Struct, dict=True):
+    name: str
+    sku: str
+    price: Decimal
+    warehouse_id: int
+    initial_quantity: Annotated[int, msgspec.Meta(ge=0)] = 0
+
+    def __post_init__(self):
+        self.name = self.name.strip()
+        self.sku = self.sku.strip()
+        if not self.name or not self.sku:
+            raise ValueError("name and sku must not be empty")
+        # Same ceiling the old NUMERIC(12,2) column had; also keeps huge
+        # exponents like 1e300000 away from the cents conversion.
+        if not self.price.is_finite() or self.price < 0 or self.price >= MAX_PRICE:
+            raise ValueError("Invalid price (must be non-negative decimal below 10000000000)")
+        self.price_cents = to_cents(self.price)
+
+class CreateProductsBulkReq(msgspec.Struct):
+    items: Annotated[list[CreateProductReq], msgspec.Meta(min_length=1)]
+
+class InventoryChangeReq(msgspec.Struct):
+    product_id: int
+    warehouse_id: int
+    quantity_delta: int
+    reason: str | None = None
+    ref_type: str | None = None
+    ref_id: int | None = None
+
+    def __post_init__(self):
+        if self.quantity_delta == 0:
+            raise ValueError("quantity_delta must be non-zero")
+
+class InventoryChangesReq(msgspec.Struct):
+    changes: Annotated[list[InventoryChangeReq], msgspec.Meta(min_length=1)]
+
+def decode_request(type_):
+    """Decode the JSON body into type_; returns (req, None) or (None, error)."""
     try:
-        d = Decimal(str(value))
-        if d < 0:
-            raise InvalidOperation()
-        return d
-    except Exception:
-        return None
+        return msgspec.json.decode(request.get_data(), type=type_, strict=False), None
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        return None, str(e)
+
+# ---- Helper ----
+# Prices are stored as integer cents; the API still speaks "12.34" strings.
+def to_cents(amount):
+    """Decimal amount -> integer cents, rounding half up like NUMERIC(12,2)."""
+    return int((amount * 100).to_integral_value(rounding=ROUND_HALF_UP))
+
+def format_cents(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+def warehouse_companies(warehouse_ids):
+    """Map each existing warehouse id to its company_id."""
+    return dict(db.session.execute(
+        select(Warehouse.id, Warehouse.company_id).where(Warehouse.id.in_(warehouse_ids))
+    ).all())
+
+def add_inventory_stmt():
+    """INSERT into inventories that adds to the quantity of an existing row.
+
+    One atomic statement per row instead of SELECT ... FOR UPDATE followed by
+    an INSERT or UPDATE. Built on the Core table so a parameter list runs as
+    a plain executemany.
+    """
+    inventories = Inventory.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = pg_insert(inventories)
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(inventories)
+    else:
+        raise NotImplementedError(f"inventory upsert is not supported on {dialect!r}; use PostgreSQL or SQLite")
+    return stmt.on_conflict_do_update(
+        index_elements=[inventories.c.product_id, inventories.c.warehouse_id],
+        set_={"quantity": inventories.c.quantity + stmt.excluded.quantity}
+    )
 
 # ---- Endpoint: Create Product ----
 @app.route("/api/products", methods=["POST"])
 def create_product():
     if not request.is_json:
         return jsonify(error="Content-Type must be application/json"), 415
-    data = request.get_json(silent=True) or {}
-
-    name = (data.get("name") or "").strip()
-    sku = (data.get("sku") or "").strip()
-    price_raw = data.get("price")
-    warehouse_id = data.get("warehouse_id")
-    initial_qty = data.get("initial_quantity", 0)
-
-    if not name or not sku or price_raw is None or warehouse_id is None:
-        return jsonify(error="Missing required fields: name, sku, price, warehouse_id"), 400
-
-    price = decimal_from(price_raw)
-    if price is None:
-        return jsonify(error="Invalid price (must be non-negative decimal)"), 400
-
-    try:
-        initial_qty = int(initial_qty)
-        if initial_qty < 0:
-            return jsonify(error="initial_quantity must be >= 0"), 400
-    except Exception:
-        return jsonify(error="initial_quantity must be an integer"), 400
-
-    wh = Warehouse.query.get(warehouse_id)
-    if not wh:
+    req, err = decode_request(CreateProductReq)
+    if err:
+        return jsonify(error=err), 400
+    name, sku, price_cents = req.name, req.sku, req.price_cents
+    warehouse_id, initial_qty = req.warehouse_id, req.initial_quantity
+
+    company_id = db.session.execute(select(Warehouse.company_id).where(Warehouse.id == warehouse_id)).scalar()
+    if company_id is None:
         return jsonify(error="warehouse_id not found"), 404
 
     try:
-        product = Product(name=name, sku=sku, price=price)
+        product = Product(name=name, sku=sku, price_cents=price_cents)
         db.session.add(product)
         db.session.flush()  # product.id available
 
-        inv = Inventory.query.filter_by(product_id=product.id, warehouse_id=warehouse_id).with_for_update().first()
-        if inv:
-            inv.quantity += initial_qty
-        else:
-            inv = Inventory(product_id=product.id, warehouse_id=warehouse_id, quantity=initial_qty)
-            db.session.add(inv)
+        quantity = db.session.execute(
+            add_inventory_stmt().returning(Inventory.__table__.c.quantity),
+            {"product_id": product.id, "warehouse_id": warehouse_id, "company_id": company_id, "quantity": initial_qty}
+        ).scalar_one()
 
         db.session.commit()
     except IntegrityError:
@@ -165,133 +415,298 @@ def create_product():
         db.session.rollback()
         return jsonify(error="Internal server error"), 500
 
+    invalidate_alerts_cache()
+
     location = url_for("get_product", product_id=product.id, _external=True)
     return jsonify(
         message="Product created",
-        product={"id": product.id, "name": product.name, "sku": product.sku, "price": str(product.price)},
-        inventory={"warehouse_id": warehouse_id, "quantity": inv.quantity},
+        product={"id": product.id, "name": product.name, "sku": product.sku, "price": format_cents(product.price_cents)},
+        inventory={"warehouse_id": warehouse_id, "quantity": quantity},
         links={"self": location}
     ), 201
 
+# ---- Endpoint: Bulk Create Products ----
+@app.route("/api/products/bulk", methods=["POST"])
+def create_products_bulk():
+    if not request.is_json:
+        return jsonify(error="Content-Type must be application/json"), 415
+    req, err = decode_request(CreateProductsBulkReq)
+    if err:
+        return jsonify(error=err), 400
+    items = req.items
+
+    wh_ids = {item.warehouse_id for item in items}
+    companies = warehouse_companies(wh_ids)
+    missing = wh_ids - companies.keys()
+    if missing:
+        return jsonify(error="warehouse_id not found", warehouse_ids=sorted(missing)), 404
+
+    try:
+        # One multi-row INSERT ... RETURNING per table instead of a flush per product.
+        ids = db.session.execute(
+            insert(Product).returning(Product.id, sort_by_parameter_order=True),
+            [{"name": item.name, "sku": item.sku, "price_cents": item.price_cents} for item in items]
+        ).scalars().all()
+        db.session.execute(insert(Inventory), [
+            {"product_id": pid, "warehouse_id": item.warehouse_id,
+             "company_id": companies[item.warehouse_id], "quantity": item.initial_quantity}
+            for pid, item in zip(ids, items)
+        ])
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(error="SKU already exists"), 409
+    except Exception:
+        db.session.rollback()
+        return jsonify(error="Internal server error"), 500
+
+    invalidate_alerts_cache()
+
+    return jsonify(
+        message="Products created",
+        products=[
+            {"id": pid, "name": item.name, "sku": item.sku, "price": format_cents(item.price_cents),
+             "warehouse_id": item.warehouse_id, "quantity": item.initial_quantity}
+            for pid, item in zip(ids, items)
+        ],
+        total=len(ids)
+    ), 201
+
 # ---- Helper: Get Product ----
 @app.route("/api/products/<int:product_id>", methods=["GET"])
 def get_product(product_id):
-    p = Product.query.get_or_404(product_id)
-    return jsonify(id=p.id, sku=p.sku, name=p.name, price=str(p.price), active=p.active)
+    p = db.session.execute(
+        select(Product.id, Product.sku, Product.name, Product.price_cents, Product.active).where(Product.id == product_id)
+    ).first()
+    if not p:
+        abort(404)
+    return jsonify(id=p.id, sku=p.sku, name=p.name, price=format_cents(p.price_cents), active=p.active)
+
+# ---- Endpoint: Record Inventory Changes ----
+@app.route("/api/inventory/changes", methods=["POST"])
+def record_inventory_changes():
+    if not request.is_json:
+        return jsonify(error="Content-Type must be application/json"), 415
+    req, err = decode_request(InventoryChangesReq)
+    if err:
+        return jsonify(error=err), 400
+    rows = [msgspec.structs.asdict(change) for change in req.changes]
+
+    wh_ids = {row["warehouse_id"] for row in rows}
+    companies = warehouse_companies(wh_ids)
+    missing = wh_ids - companies.keys()
+    if missing:
+        return jsonify(error="warehouse_id not found", warehouse_ids=sorted(missing)), 404
+    for row in rows:
+        row["company_id"] = companies[row["warehouse_id"]]
+
+    # Net the deltas so each inventory row is updated once per request.
+    deltas = {}
+    for row in rows:
+        key = (row["product_id"], row["warehouse_id"])
+        deltas[key] = deltas.get(key, 0) + row["quantity_delta"]
+    # Upsert in key order so concurrent requests lock shared rows in the same
+    # order instead of deadlocking.
+    keys = sorted(deltas)
+
+    add_stock = add_inventory_stmt()
+
+    # Everything below runs in one transaction, in INVENTORY_BATCH_SIZE chunks.
+    try:
+        for start in range(0, len(rows), INVENTORY_BATCH_SIZE):
+            db.session.execute(insert(InventoryChange), rows[start:start + INVENTORY_BATCH_SIZE])
+
+        for start in range(0, len(keys), INVENTORY_BATCH_SIZE):
+            batch = keys[start:start + INVENTORY_BATCH_SIZE]
+            db.session.execute(add_stock, [
+                {"product_id": pid, "warehouse_id": wid, "company_id": companies[wid], "quantity": deltas[(pid, wid)]}
+                for pid, wid in batch
+            ])
+
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify(error="Unknown product_id"), 409
+    except Exception:
+        db.session.rollback()
+        app.logger.exception("inventory changes: write failed")
+        return jsonify(error="Internal server error"), 500
+
+    invalidate_alerts_cache()
+
+    return jsonify(message="Inventory changes recorded", total_changes=len(rows), total_inventories=len(keys)), 201
 
 # ---- Endpoint: Low Stock Alerts ----
+# Cached per (company, days). Inventory writes bump a global version instead
+# of deleting keys, which orphans every cached report at once; orphans
+# expire through the TTL. The cache is best-effort: a backend failure is
+# logged and the request carries on as a cache miss.
+def alerts_cache_key(company_id, days):
+    """Current cache key, or None if the version can't be read."""
+    try:
+        version = cache.get("alerts:version") or 0
+    except Exception:
+        app.logger.warning("alerts cache: reading version failed", exc_info=True)
+        return None
+    return f"alerts:v{version}:{company_id}:{days}"
+
+def cache_get(key):
+    try:
+        return cache.get(key)
+    except Exception:
+        app.logger.warning("alerts cache: get %s failed", key, exc_info=True)
+        return None
+
+def cache_set(key, value):
+    try:
+        cache.set(key, value, timeout=ALERTS_CACHE_TIMEOUT)
+    except Exception:
+        app.logger.warning("alerts cache: set %s failed", key, exc_info=True)
+
+def invalidate_alerts_cache():
+    try:
+        cache.cache.inc("alerts:version")
+    except Exception:
+        app.logger.warning("alerts cache: version bump failed; reports may be stale "
+                           "for up to %ss", ALERTS_CACHE_TIMEOUT, exc_info=True)
+
+# Read-only report, run as Core statements rather than ORM queries: one for
+# the alert rows, then one per streamed batch for the suppliers of products
+# not seen yet, so multiple suppliers per product never multiply alert rows.
+# days_until_stockout is integer division (truncates like int()), widened to
+# BIGINT first so large stock times days cannot overflow int4.
+LOW_STOCK_SQL = text("""
+WITH recent_sales AS (
+    SELECT ds.product_id, ds.warehouse_id, SUM(ds.qty) AS qty
+    FROM daily_sales_summary ds
+    WHERE ds.company_id = :company_id AND ds.sale_date >= :since
+    GROUP BY ds.product_id, ds.warehouse_id
+)
+SELECT p.id AS product_id,
+       p.name AS product_name,
+       p.sku AS sku,
+       w.id AS warehouse_id,
+       w.name AS warehouse_name,
+       i.quantity AS current_stock,
+       COALESCE(et.threshold, 0) AS threshold,
+       CAST(i.quantity AS BIGINT) * :days / NULLIF(rs.qty, 0) AS days_until_stockout
+FROM inventories i
+JOIN products p ON p.id = i.product_id
+JOIN warehouses w ON w.id = i.warehouse_id
+JOIN recent_sales rs ON rs.product_id = i.product_id AND rs.warehouse_id = i.warehouse_id
+LEFT JOIN effective_thresholds et ON et.product_id = i.product_id AND et.warehouse_id = i.warehouse_id
+WHERE i.company_id = :company_id
+  AND i.quantity < COALESCE(et.threshold, 0)
+""").bindparams(bindparam("since", type_=db.Date))
+
+# Preferred supplier per product: shortest lead time, scoped to the company,
+# with NULL company_id links shared across tenants.
+PREFERRED_SUPPLIERS_SQL = text("""
+SELECT product_id, supplier_id, supplier_name, supplier_email
+FROM (
+    SELECT sp.product_id,
+           s.id AS supplier_id,
+           s.name AS supplier_name,
+           s.contact_email AS supplier_email,
+           ROW_NUMBER() OVER (PARTITION BY sp.product_id ORDER BY sp.lead_time_days, s.id) AS rn
+    FROM supplier_products sp
+    JOIN suppliers s ON s.id = sp.supplier_id
+    WHERE sp.product_id IN :product_ids
+      AND (sp.company_id = :company_id OR sp.company_id IS NULL)
+) ranked
+WHERE rn = 1
+""").bindparams(bindparam("product_ids", expanding=True))
+
+NO_SUPPLIER = {"id": None, "name": None, "contact_email": None}
+
+def preferred_suppliers(company_id, product_ids):
+    """Map product_id -> supplier dict for the given products."""
+    rows = db.session.execute(
+        PREFERRED_SUPPLIERS_SQL, {"company_id": company_id, "product_ids": list(product_ids)}
+    ).mappings()
+    return {
+        row["product_id"]: {"id": row["supplier_id"], "name": row["supplier_name"], "contact_email": row["supplier_email"]}
+        for row in rows
+    }
+
 @app.route("/api/companies/<int:company_id>/alerts/low-stock", methods=["GET"])
 def low_stock_alerts(company_id):
-    company = Company.query.get(company_id)
-    if not company:
-        return jsonify(error="company not found"), 404
-
     try:
         days = int(request.args.get("days", 30))
         if days <= 0:
             days = 30
     except Exception:
         days = 30
-    since = datetime.utcnow() - timedelta(days=days)
-
-    recent_sales = (
-        db.session.query(
-            SalesOrderItem.product_id.label("pid"),
-            SalesOrderItem.warehouse_id.label("wid"),
-            func.sum(SalesOrderItem.quantity).label("qty_30d")
-        )
-        .join(SalesOrder, SalesOrder.id == SalesOrderItem.order_id)
-        .filter(SalesOrder.company_id == company_id)
-        .filter(SalesOrder.ordered_at >= since)
-        .group_by(SalesOrderItem.product_id, SalesOrderItem.warehouse_id)
-        .subquery()
-    )
 
-    wh_ids = db.session.query(Warehouse.id).filter(Warehouse.company_id == company_id).subquery()
+    cache_key = alerts_cache_key(company_id, days)
+    cached = cache_get(cache_key) if cache_key else None
+    if cached is not None:
+        return Response(cached, status=200, mimetype="application/json")
 
-    inv = (
-        db.session.query(
-            Inventory.product_id,
-            Inventory.warehouse_id,
-            Inventory.quantity,
-        )
-        .filter(Inventory.warehouse_id.in_(wh_ids))
-        .subquery()
-    )
-
-    threshold = (
-        db.session.query(
-            Product.id.label("pid"),
-            inv.c.warehouse_id.label("wid"),
-            func.coalesce(ProductThresholdOverride.threshold, ProductThreshold.threshold, 0).label("thresh")
-        )
-        .join(inv, inv.c.product_id == Product.id)
-        .outerjoin(ProductThreshold, ProductThreshold.product_id == Product.id)
-        .outerjoin(ProductThresholdOverride, and_(
-            ProductThresholdOverride.product_id == Product.id,
-            ProductThresholdOverride.warehouse_id == inv.c.warehouse_id
-        ))
-        .subquery()
-    )
-
-    supplier_sub = (
-        db.session.query(
-            SupplierProduct.product_id.label("pid"),
-            Supplier.id.label("sid"),
-            Supplier.name.label("sname"),
-            Supplier.contact_email.label("semail"),
-            func.min(SupplierProduct.lead_time_days).label("lead")
-        )
-        .join(Supplier, Supplier.id == SupplierProduct.supplier_id)
-        .group_by(SupplierProduct.product_id, Supplier.id, Supplier.name, Supplier.contact_email)
-        .subquery()
-    )
-
-    q = (
-        db.session.query(
-            Product.id.label("product_id"),
-            Product.name.label("product_name"),
-            Product.sku.label("sku"),
-            Warehouse.id.label("warehouse_id"),
-            Warehouse.name.label("warehouse_name"),
-            inv.c.quantity.label("current_stock"),
-            threshold.c.thresh.label("threshold"),
-            func.coalesce(recent_sales.c.qty_30d, 0).label("qty_30d"),
-            supplier_sub.c.sid.label("supplier_id"),
-            supplier_sub.c.sname.label("supplier_name"),
-            supplier_sub.c.semail.label("supplier_email")
-        )
-        .join(inv, inv.c.product_id == Product.id)
-        .join(Warehouse, Warehouse.id == inv.c.warehouse_id)
-        .join(threshold, and_(threshold.c.pid == Product.id, threshold.c.wid == Warehouse.id))
-        .outerjoin(recent_sales, and_(recent_sales.c.pid == Product.id, recent_sales.c.wid == Warehouse.id))
-        .outerjoin(supplier_sub, supplier_sub.c.pid == Product.id)
-        .filter(recent_sales.c.qty_30d.isnot(None))
-        .filter(inv.c.quantity < threshold.c.thresh)
-    )
-
-    alerts = []
-    for row in q.all():
-        avg_daily = row.qty_30d / days if row.qty_30d and days > 0 else None
-        days_until = int(row.current_stock / avg_daily) if avg_daily and avg_daily > 0 else None
-        alerts.append({
-            "product_id": row.product_id,
-            "product_name": row.product_name,
-            "sku": row.sku,
-            "warehouse_id": row.warehouse_id,
-            "warehouse_name": row.warehouse_name,
-            "current_stock": int(row.current_stock),
-            "threshold": int(row.threshold),
-            "days_until_stockout": days_until,
-            "supplier": {
-                "id": row.supplier_id,
-                "name": row.supplier_name,
-                "contact_email": row.supplier_email
-            }
-        })
-    return jsonify({"alerts": alerts, "total_alerts": len(alerts)}), 200
+    if not db.session.execute(select(1).where(Company.id == company_id)).scalar():
+        return jsonify(error="company not found"), 404
 
+    # The window is the last `days` calendar days (UTC), today included.
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    result = db.session.execute(
+        LOW_STOCK_SQL, {"company_id": company_id, "since": since, "days": days}
+    ).yield_per(ALERTS_BATCH_SIZE).mappings()
+
+    # Stream the JSON document one batch of rows at a time so large tenants
+    # never hold the full result set (or its encoded form) in memory. The
+    # body is kept for the cache only while it stays under the size cap.
+    def generate():
+        total = 0
+        parts, size = [], 0
+        def emit(chunk):
+            nonlocal parts, size
+            if parts is not None:
+                size += len(chunk)
+                if size <= ALERTS_CACHE_MAX_BYTES:
+                    parts.append(chunk)
+                else:
+                    parts = None
+            return chunk
+
+        suppliers = {}
+        yield emit(b'{"alerts":[')
+        for rows in result.partitions():
+            new_pids = {row["product_id"] for row in rows} - suppliers.keys()
+            if new_pids:
+                found = preferred_suppliers(company_id, new_pids)
+                suppliers.update((pid, found.get(pid, NO_SUPPLIER)) for pid in new_pids)
+            chunk = b",".join(orjson.dumps({
+                "product_id": row["product_id"],
+                "product_name": row["product_name"],
+                "sku": row["sku"],
+                "warehouse_id": row["warehouse_id"],
+                "warehouse_name": row["warehouse_name"],
+                "current_stock": row["current_stock"],
+                "threshold": row["threshold"],
+                "days_until_stockout": row["days_until_stockout"],
+                "supplier": suppliers[row["product_id"]]
+            }) for row in rows)
+            yield emit((b"," if total else b"") + chunk)
+            total += len(rows)
+        yield emit(b'],"total_alerts":%d}' % total)
+        if cache_key and parts is not None:
+            cache_set(cache_key, b"".join(parts))
+
+    return Response(stream_with_context(generate()), status=200, mimetype="application/json")
+
+# ---- ASGI entrypoint ----
+# uvicorn app:asgi_app --workers 4 --loop uvloop
+# Views stay synchronous: WSGIMiddleware runs each request on its own thread
+# from a pool of ASGI_THREADS, so a slow alerts stream ties up one thread
+# rather than the event loop or the other requests in the worker.
+asgi_app = WSGIMiddleware(app, workers=ASGI_THREADS)
+
+@app.cli.command("init-schema")
+def init_schema_command():
+    """Create all tables, views and triggers that do not exist yet."""
+    db.create_all()
+
+# Development server only; production runs wsgi:app under gunicorn.
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,5 @@
+-- Indexes for the low-stock alerts query on an existing database.
+-- Run outside a transaction block (CONCURRENTLY does not allow one):
+--   psql "$DATABASE_URL" -f migrations/0001_low_stock_indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_sp_product_lead ON supplier_products(product_id, lead_time_days);
@@ -0,0 +1,14 @@
+-- Materialized effective thresholds used by the low-stock alerts query.
+-- Refresh it with `flask refresh-thresholds`.
+--   psql "$DATABASE_URL" -f migrations/0002_effective_thresholds.sql
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS effective_thresholds AS
+SELECT p.id AS product_id, w.id AS warehouse_id, COALESCE(o.threshold, t.threshold) AS threshold
+FROM products p
+CROSS JOIN warehouses w
+LEFT JOIN product_thresholds t ON t.product_id = p.id
+LEFT JOIN product_threshold_overrides o ON o.product_id = p.id AND o.warehouse_id = w.id
+WHERE o.threshold IS NOT NULL OR t.threshold IS NOT NULL;
+
+-- Required for REFRESH MATERIALIZED VIEW CONCURRENTLY.
+CREATE UNIQUE INDEX IF NOT EXISTS ux_effective_thresholds ON effective_thresholds(product_id, warehouse_id);
@@ -0,0 +1,25 @@
+-- Let the database stamp ledger and order rows; the app no longer sends them.
+--   psql "$DATABASE_URL" -f migrations/0003_server_default_timestamps.sql
+-- schema.sql declares these columns TIMESTAMPTZ, where now() is already an
+-- absolute instant. Databases created via create_all() have naive TIMESTAMP
+-- columns holding UTC, which need now() converted to UTC first; applying that
+-- to a TIMESTAMPTZ column would shift every stamp by the session's offset.
+
+DO $$
+DECLARE
+  col RECORD;
+BEGIN
+  FOR col IN
+    SELECT table_name, column_name, data_type
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+      AND (table_name, column_name) IN (('inventory_changes', 'changed_at'), ('sales_orders', 'ordered_at'))
+  LOOP
+    IF col.data_type = 'timestamp without time zone' THEN
+      EXECUTE format('ALTER TABLE %I ALTER COLUMN %I SET DEFAULT (now() AT TIME ZONE %L)', col.table_name, col.column_name, 'utc');
+    ELSE
+      EXECUTE format('ALTER TABLE %I ALTER COLUMN %I SET DEFAULT now()', col.table_name, col.column_name);
+    END IF;
+  END LOOP;
+END;
+$$;
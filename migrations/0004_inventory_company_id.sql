@@ -0,0 +1,17 @@
+-- Denormalize the owning company onto inventory rows and the ledger.
+--   psql "$DATABASE_URL" -f migrations/0004_inventory_company_id.sql
+
+BEGIN;
+
+ALTER TABLE inventories ADD COLUMN IF NOT EXISTS company_id BIGINT REFERENCES companies(id) ON DELETE CASCADE;
+ALTER TABLE inventory_changes ADD COLUMN IF NOT EXISTS company_id BIGINT REFERENCES companies(id) ON DELETE CASCADE;
+
+UPDATE inventories i SET company_id = w.company_id FROM warehouses w WHERE w.id = i.warehouse_id AND i.company_id IS NULL;
+UPDATE inventory_changes c SET company_id = w.company_id FROM warehouses w WHERE w.id = c.warehouse_id AND c.company_id IS NULL;
+
+ALTER TABLE inventories ALTER COLUMN company_id SET NOT NULL;
+ALTER TABLE inventory_changes ALTER COLUMN company_id SET NOT NULL;
+
+COMMIT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_inv_company_wh ON inventories(company_id, warehouse_id);
@@ -0,0 +1,42 @@
+-- Trigger-maintained daily sales rollup read by the low-stock alerts query.
+--   psql "$DATABASE_URL" -f migrations/0005_daily_sales_summary.sql
+-- The trigger and the backfill run in one transaction so no sale is
+-- counted twice or missed while the migration runs.
+-- ordered_at is TIMESTAMPTZ here; sale days are taken in UTC, not in the
+-- session's time zone.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS daily_sales_summary (
+  company_id BIGINT NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+  sale_date DATE NOT NULL,
+  product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+  warehouse_id BIGINT NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+  qty INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (company_id, sale_date, product_id, warehouse_id)
+);
+
+CREATE OR REPLACE FUNCTION daily_sales_summary_add() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO daily_sales_summary (company_id, sale_date, product_id, warehouse_id, qty)
+  SELECT so.company_id, (so.ordered_at AT TIME ZONE 'utc')::date, NEW.product_id, NEW.warehouse_id, NEW.quantity
+  FROM sales_orders so WHERE so.id = NEW.order_id
+  ON CONFLICT (company_id, sale_date, product_id, warehouse_id)
+  DO UPDATE SET qty = daily_sales_summary.qty + EXCLUDED.qty;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sales_order_items_summary ON sales_order_items;
+CREATE TRIGGER trg_sales_order_items_summary AFTER INSERT ON sales_order_items
+FOR EACH ROW EXECUTE FUNCTION daily_sales_summary_add();
+
+LOCK TABLE sales_order_items IN SHARE MODE;
+INSERT INTO daily_sales_summary (company_id, sale_date, product_id, warehouse_id, qty)
+SELECT so.company_id, (so.ordered_at AT TIME ZONE 'utc')::date, soi.product_id, soi.warehouse_id, SUM(soi.quantity)
+FROM sales_order_items soi
+JOIN sales_orders so ON so.id = soi.order_id
+GROUP BY so.company_id, (so.ordered_at AT TIME ZONE 'utc')::date, soi.product_id, soi.warehouse_id
+ON CONFLICT (company_id, sale_date, product_id, warehouse_id) DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,12 @@
+-- Store product prices as integer cents instead of NUMERIC(12,2).
+--   psql "$DATABASE_URL" -f migrations/0006_price_cents.sql
+
+BEGIN;
+
+ALTER TABLE products ADD COLUMN price_cents BIGINT;
+UPDATE products SET price_cents = ROUND(price * 100);
+ALTER TABLE products ALTER COLUMN price_cents SET NOT NULL;
+ALTER TABLE products ALTER COLUMN price_cents SET DEFAULT 0;
+ALTER TABLE products DROP COLUMN price;
+
+COMMIT;
@@ -17,7 +17,7 @@ CREATE TABLE IF NOT EXISTS products (
   id BIGSERIAL PRIMARY KEY,
   sku TEXT NOT NULL UNIQUE,
   name TEXT NOT NULL,
-  price NUMERIC(12,2) NOT NULL DEFAULT 0.00,
+  price_cents BIGINT NOT NULL DEFAULT 0,
   product_type TEXT NOT NULL DEFAULT 'standard',
   active BOOLEAN NOT NULL DEFAULT TRUE
 );
@@ -40,6 +40,7 @@ CREATE TABLE IF NOT EXISTS supplier_products (
 CREATE TABLE IF NOT EXISTS inventories (
   product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
   warehouse_id BIGINT NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+  company_id BIGINT NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
   quantity INT NOT NULL DEFAULT 0,
   safety_stock INT DEFAULT 0,
   PRIMARY KEY (product_id, warehouse_id)
@@ -49,6 +50,7 @@ CREATE TABLE IF NOT EXISTS inventory_changes (
   id BIGSERIAL PRIMARY KEY,
   product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
   warehouse_id BIGINT NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+  company_id BIGINT NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
   quantity_delta INT NOT NULL,
   reason TEXT,
   ref_type TEXT,
@@ -89,7 +91,45 @@ CREATE TABLE IF NOT EXISTS product_threshold_overrides (
   PRIMARY KEY (product_id, warehouse_id)
 );
 
+-- Daily sales per (company, day, product, warehouse), maintained on insert.
+CREATE TABLE IF NOT EXISTS daily_sales_summary (
+  company_id BIGINT NOT NULL REFERENCES companies(id) ON DELETE CASCADE,
+  sale_date DATE NOT NULL,
+  product_id BIGINT NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+  warehouse_id BIGINT NOT NULL REFERENCES warehouses(id) ON DELETE CASCADE,
+  qty INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (company_id, sale_date, product_id, warehouse_id)
+);
+
+CREATE OR REPLACE FUNCTION daily_sales_summary_add() RETURNS trigger AS $$
+BEGIN
+  INSERT INTO daily_sales_summary (company_id, sale_date, product_id, warehouse_id, qty)
+  SELECT so.company_id, (so.ordered_at AT TIME ZONE 'utc')::date, NEW.product_id, NEW.warehouse_id, NEW.quantity
+  FROM sales_orders so WHERE so.id = NEW.order_id
+  ON CONFLICT (company_id, sale_date, product_id, warehouse_id)
+  DO UPDATE SET qty = daily_sales_summary.qty + EXCLUDED.qty;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_sales_order_items_summary ON sales_order_items;
+CREATE TRIGGER trg_sales_order_items_summary AFTER INSERT ON sales_order_items
+FOR EACH ROW EXECUTE FUNCTION daily_sales_summary_add();
+
 CREATE INDEX IF NOT EXISTS idx_inventory_product ON inventories(product_id);
 CREATE INDEX IF NOT EXISTS idx_inventory_wh ON inventories(warehouse_id);
 CREATE INDEX IF NOT EXISTS idx_inv_changes_pwh ON inventory_changes(product_id, warehouse_id, changed_at DESC);
-CREATE INDEX IF NOT EXISTS idx_sales_items_pwh ON sales_order_items(product_id, warehouse_id);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_sales_items_pwh ON sales_order_items(product_id, warehouse_id);
+CREATE INDEX IF NOT EXISTS ix_inv_company_wh ON inventories(company_id, warehouse_id);
+CREATE INDEX IF NOT EXISTS ix_sp_product_lead ON supplier_products(product_id, lead_time_days);
+
+-- Effective threshold per (product, warehouse): override if present, else the
+-- product default. Refreshed out of band with `flask refresh-thresholds`.
+CREATE MATERIALIZED VIEW IF NOT EXISTS effective_thresholds AS
+SELECT p.id AS product_id, w.id AS warehouse_id, COALESCE(o.threshold, t.threshold) AS threshold
+FROM products p
+CROSS JOIN warehouses w
+LEFT JOIN product_thresholds t ON t.product_id = p.id
+LEFT JOIN product_threshold_overrides o ON o.product_id = p.id AND o.warehouse_id = w.id
+WHERE o.threshold IS NOT NULL OR t.threshold IS NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_effective_thresholds ON effective_thresholds(product_id, warehouse_id);
@@ -0,0 +1,2 @@
+# gunicorn -w 4 -k gthread --threads 8 --preload wsgi:app
+from app import app